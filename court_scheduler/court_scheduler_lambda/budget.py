@@ -0,0 +1,130 @@
+""" Lambda execution budget
+"""
+import logging
+import logging.config
+import time
+
+logging.config.fileConfig(fname="logging.conf", disable_existing_loggers=False)
+logger = logging.getLogger(__name__)
+
+# Phases of a booking run, in the order they are entered
+PHASES = ("login", "list", "prepare", "post", "verify")
+
+# Maximum time in milliseconds a single phase may spend waiting on a request
+PHASE_ALLOWANCES_MS = {
+    "login": 6000,
+    "list": 6000,
+    "prepare": 6000,
+    "post": 5000,
+    "verify": 3000,
+}
+
+# Phases a booking needs, which are always left enough time to run
+RESERVED_PHASES = ("prepare", "post", "verify")
+
+# Shortest request timeout worth attempting
+MIN_REQUEST_MS = 1000
+
+
+class BudgetExceededError(Exception):
+    """Raised when a phase cannot start without eating into reserved time"""
+
+
+class ExecutionBudget:
+    """Tracks the time remaining before the lambda function times out"""
+
+    def __init__(self, context=None, total_ms: int = 30000, safety_ms: int = 500):
+        """
+        Args:
+            context (object): AWS Lambda context object. When it is not provided a
+                                local clock starting at total_ms is used.
+            total_ms (int): Time limit in milliseconds used with the local clock
+            safety_ms (int): Time in milliseconds kept back for returning a response
+
+        Returns:
+            None
+        """
+        self.context = context
+        self.safety_ms = safety_ms
+        self.phase = None
+        self._deadline = time.monotonic() + total_ms / 1000
+
+    def remaining_ms(self) -> int:
+        """Returns the milliseconds left before the deadline, less the safety margin"""
+        if self.context is not None and hasattr(
+            self.context, "get_remaining_time_in_millis"
+        ):
+            remaining = self.context.get_remaining_time_in_millis()
+        else:
+            remaining = (self._deadline - time.monotonic()) * 1000
+        return int(remaining) - self.safety_ms
+
+    @staticmethod
+    def reserve_after(phase: str) -> int:
+        """Returns the milliseconds held back for reserved phases after the given phase
+
+        Args:
+            phase (str): Phase name
+
+        Returns:
+            (int) Reserved milliseconds
+        """
+        position = PHASES.index(phase)
+        return sum(
+            PHASE_ALLOWANCES_MS[name]
+            for name in PHASES[position + 1 :]
+            if name in RESERVED_PHASES
+        )
+
+    def allows(self, phase: str) -> bool:
+        """Returns True when the full allowance of a phase fits in the remaining time.
+            Use to decide whether optional work should be skipped.
+
+        Args:
+            phase (str): Phase name
+
+        Returns:
+            (bool)
+        """
+        return self.remaining_ms() >= PHASE_ALLOWANCES_MS[phase] + self.reserve_after(
+            phase
+        )
+
+    def enter(self, phase: str) -> None:
+        """Starts a phase
+
+        Args:
+            phase (str): Phase name
+
+        Returns:
+            None
+
+        Raises:
+            BudgetExceededError when the phase cannot start without using time reserved
+                for later phases
+        """
+        remaining = self.remaining_ms()
+        available = remaining - self.reserve_after(phase)
+        logger.debug("Entering %s phase with %s ms remaining", phase, remaining)
+        if available < MIN_REQUEST_MS:
+            raise BudgetExceededError(
+                f"Not enough time left for {phase}: {remaining} ms remaining"
+            )
+        self.phase = phase
+
+    def request_timeout(self) -> float:
+        """Returns the timeout in seconds for a request made in the current phase
+
+        Raises:
+            BudgetExceededError when a request cannot be made without using time
+                reserved for later phases
+        """
+        if self.phase is None:
+            return PHASE_ALLOWANCES_MS[PHASES[0]] / 1000
+        available = self.remaining_ms() - self.reserve_after(self.phase)
+        if available < MIN_REQUEST_MS:
+            raise BudgetExceededError(
+                f"Not enough time left for a {self.phase} request: "
+                f"{available} ms available"
+            )
+        return min(PHASE_ALLOWANCES_MS[self.phase], available) / 1000
@@ -1,19 +1,25 @@
 """ app.court.reserve.com adapter
 """
-from collections import defaultdict
+from concurrent.futures import Executor
+from functools import partial
 import logging
 import logging.config
-import re
-import json
+import time
 from datetime import datetime
 
 import requests
-from bs4 import BeautifulSoup
 from dateutil import tz
 
+import parsers
+from budget import ExecutionBudget, BudgetExceededError
+from models import CourtSchedule, Slot
+from ratelimit import RateLimiter, CRITICAL, INTERACTIVE, BACKGROUND
+
 logging.config.fileConfig(fname="logging.conf", disable_existing_loggers=False)
 logger = logging.getLogger(__name__)
 
+HOST = "app.courtreserve.com"
+
 
 class CourtReserveAdapter:
     """Interfaces with app.courtreserve.com"""
@@ -23,12 +29,22 @@ class CourtReserveAdapter:
         org_id: str,
         username: str,
         password: str,
+        budget: ExecutionBudget = None,
+        parse_executor: Executor = None,
+        rate_limiter: RateLimiter = None,
     ) -> None:
         """
         Args:
             org_id (str): Organization id
             username (str): username
             password (str): password
+            budget (ExecutionBudget): Optional execution budget used to start phases
+                                        and set request timeouts
+            parse_executor (Executor): Optional executor used to parse responses, for
+                                        example a ProcessPoolExecutor shared by
+                                        several accounts
+            rate_limiter (RateLimiter): Optional rate limiter shared by accounts
+                                        and workers
 
         Returns:
             None
@@ -36,25 +52,90 @@ class CourtReserveAdapter:
         self.org_id = org_id
         self.session_id = None
         self.http_headers = None
+        self.court_criteria = None
+        self.budget = budget
+        self.parse_executor = parse_executor
+        self.rate_limiter = rate_limiter
+        self.account = f"{org_id}:{username}"
         self.session = requests.Session()
         if org_id and username and password:
             self._login(username, password)
 
-    def _request(self, method: str, path: str, **kwargs) -> requests.Response:
+    def _request(
+        self, method: str, path: str, priority: int = INTERACTIVE, **kwargs
+    ) -> requests.Response:
         """Sends HTTP requests
 
         Args:
             method (str): HTTP method. Example values: GET, POST
             path (str): path of the URL
+            priority (int): Rate limiter priority. Example values: CRITICAL,
+                            INTERACTIVE, BACKGROUND
 
         Returns:
             Response object
+
+        Raises:
+            BudgetExceededError when the rate limiter does not allow the request
+                before the request timeout
         """
         request = requests.Request(
-            method.upper(), f"https://app.courtreserve.com/Online/{path}", **kwargs
+            method.upper(), f"https://{HOST}/Online/{path}", **kwargs
         )
         prepped = self.session.prepare_request(request)
-        return self.session.send(prepped)
+        timeout = self.budget.request_timeout() if self.budget else None
+        if self.rate_limiter:
+            # Time spent waiting for the rate limiter comes out of the request timeout
+            started = time.monotonic()
+            if not self.rate_limiter.acquire(HOST, self.account, priority, timeout):
+                raise BudgetExceededError(f"Rate limited request to {path} timed out")
+            if timeout is not None:
+                timeout = min(
+                    timeout - (time.monotonic() - started),
+                    self.budget.request_timeout(),
+                )
+                if timeout <= 0:
+                    raise BudgetExceededError(
+                        f"Rate limited request to {path} timed out"
+                    )
+        response = self.session.send(prepped, timeout=timeout)
+        if self.rate_limiter:
+            self.rate_limiter.record(
+                HOST,
+                self.account,
+                response.status_code,
+                response.headers.get("Retry-After"),
+            )
+        return response
+
+    def _parse(self, parser, response: requests.Response):
+        """Parses a response body, in the parse executor when one is set
+
+        Args:
+            parser (function): Function from the parsers module
+            response (Response): HTTP response
+
+        Returns:
+            Parser result
+        """
+        if self.parse_executor:
+            return self.parse_executor.submit(parser, response.content).result()
+        return parser(response.content)
+
+    def _enter_phase(self, phase: str) -> None:
+        """Starts a phase of the execution budget, when a budget is set
+
+        Args:
+            phase (str): Phase name
+
+        Returns:
+            None
+
+        Raises:
+            BudgetExceededError when there is not enough time left for the phase
+        """
+        if self.budget:
+            self.budget.enter(phase)
 
     def _login(self, username: str, password: str) -> None:
         """Peform user login to app.courtreserve.com
@@ -71,23 +152,18 @@ class CourtReserveAdapter:
         """
         path = f"Account/Login/{self.org_id}"
         payload = {"UserNameOrEmail": username, "Password": password}
-        token_name = "__RequestVerificationToken"
+        self._enter_phase("login")
 
         # Add hidden __RequestVerificationToken to login request
         response = self._request("GET", path)
-        soup = BeautifulSoup(response.text, "html.parser")
-        payload[token_name] = soup.find(id="loginForm").find(
-            attrs={"name": token_name}
-        )["value"]
+        payload[parsers.TOKEN_NAME] = self._parse(parsers.parse_login_token, response)
 
         response = self._request("POST", path, data=payload)
         # Expect redirect on successful login
         assert response.url.find("Account/Login") == -1, "Login attempt failed."
 
         # Get session id
-        soup = BeautifulSoup(response.text, "html.parser")
-        bookings_path = soup.select_one("#respMenu li:nth-child(2) li a")["href"]
-        self.session_id = re.search("sId=([0-9]+)", bookings_path).group(1)
+        self.session_id = self._parse(parsers.parse_session_id, response)
         logger.debug("Found session id: %s", self.session_id)
 
         self.http_headers = {
@@ -115,40 +191,46 @@ class CourtReserveAdapter:
             "accept-language": "en-US,en;q=0.9",
         }
 
-    def list_reservations(self, date: datetime) -> dict:
-        """Returns existing reservations grouped by court
+    def _court_criteria(self, priority: int = BACKGROUND) -> dict:
+        """Returns court selection criteria from the Bookings page.
+            Criteria are cached after the first request.
 
-        Arg:
-            date (datetime): Reservation date
+        Args:
+            priority (int): Rate limiter priority
 
         Returns:
-            (dict) For each court, a list of start and end datetime the
-                    court is reserved
+            (dict) Time zone, cost type id, selected court ids and member id
         """
-        # Get court selection criteria
+        if self.court_criteria:
+            return self.court_criteria
 
         response = self._request(
-            "GET", f"Reservations/Bookings/{self.org_id}?sId={self.session_id}"
+            "GET",
+            f"Reservations/Bookings/{self.org_id}?sId={self.session_id}",
+            priority=priority,
         )
-        pattern = re.compile(r"getSelectedCriteriasCourtsView\(\)")
-        soup = BeautifulSoup(response.text, "html.parser")
-        court_criteria = [
-            str(script.string)
-            for script in soup.select(
-                "#expanded-page div.content div.row div.col-lg-12 script"
-            )
-            if pattern.search(str(script.string)) is not None
-        ][0]
-        time_zone = re.search(r"TimeZone: '([A-Za-z_\/]+)'", court_criteria).group(1)
-        cost_type_id = re.search("CostTypeId: '([0-9]+)'", court_criteria).group(1)
-        court_ids = re.search("SelectedCourtIds: '([0-9,]+)'", court_criteria).group(1)
-        member_id = re.search("MemberIds: '([0-9]+)'", court_criteria).group(1)
+        self.court_criteria = self._parse(parsers.parse_court_criteria, response)
+        return self.court_criteria
 
+    def _read_expanded(
+        self, date: datetime, court_ids: str, priority: int = BACKGROUND
+    ) -> requests.Response:
+        """Requests reservations for the given courts
+
+        Args:
+            date (datetime): Reservation date
+            court_ids (str): Comma separated court ids
+            priority (int): Rate limiter priority
+
+        Returns:
+            ReadExpanded response object
+        """
+        criteria = self._court_criteria(priority)
         payload = {
             "startDate": f"{date.strftime('%Y-%m-%d')}T07:00:00.000Z",
             "end": f"{date.strftime('%Y-%m-%d')}T07:00:00.000Z",
             "orgId": self.org_id,
-            "TimeZone": time_zone,
+            "TimeZone": criteria["time_zone"],
             "Date": (
                 f"{date.strftime('%a')},"
                 f" {date.day}"
@@ -162,86 +244,77 @@ class CourtReserveAdapter:
                 "Day": date.day,
             },
             "UiCulture": "en-US",
-            "CostTypeId": cost_type_id,
+            "CostTypeId": criteria["cost_type_id"],
             "CustomSchedulerId": self.session_id,
             "ReservationMinInterval": "60",
             "SelectedCourtIds": court_ids,
-            "MemberIds": member_id,
+            "MemberIds": criteria["member_id"],
             "MemberFamilyId": "",
         }
 
-        response = self._request(
+        return self._request(
             "POST",
             f"Reservations/ReadExpanded/{self.org_id}",
             data=f"jsonData={payload}",
             headers=self.http_headers,
+            priority=priority,
         )
-        json_resp = json.loads(response.text)
-        logger.debug("Found %s reservations", json_resp["Total"])
 
-        tz_obj = tz.obj = tz.gettz(time_zone)
-        court_bookings = {}
-        epoch_re = re.compile("[0-9]+")
-        # Get datetime objects from POSIX timestamp, grouped by court id
-        for booking in json_resp["Data"]:
-            court_label = str(booking["CourtLabel"])
-            if not court_bookings.get(court_label):
-                court_bookings[court_label] = {
-                    "court_id": booking["CourtId"],
-                    "start_end_times": [],
-                }
-            court_bookings[court_label]["start_end_times"].append(
-                (
-                    datetime.fromtimestamp(
-                        int(epoch_re.search(booking["Start"]).group(0)) / 1000,
-                        tz=tz_obj,
-                    ),
-                    datetime.fromtimestamp(
-                        int(epoch_re.search(booking["End"]).group(0)) / 1000, tz=tz_obj
-                    ),
-                )
-            )
+    def list_reservations(self, date: datetime) -> dict:
+        """Returns existing reservations grouped by court
 
-        # Merge contiguous reservations by court
-        for court_label in court_bookings:
-            court_bookings[court_label]["start_end_times"] = self._merge_bookings(
-                court_bookings[court_label]["start_end_times"]
-            )
+        Arg:
+            date (datetime): Reservation date
+
+        Returns:
+            (dict) Court schedule for each court label. Use CourtSchedule.to_dict for
+                    a list of start and end datetime the court is reserved
+        """
+        self._enter_phase("list")
+        # Get court selection criteria
+        criteria = self._court_criteria()
+        response = self._read_expanded(date, criteria["court_ids"])
+        bookings = self._parse(parsers.parse_bookings, response)
+        logger.debug("Found %s reservations", len(bookings))
+
+        tz_obj = tz.gettz(criteria["time_zone"])
+        court_bookings = {}
+        # Merge POSIX timestamps into a schedule for each court label
+        for court_label, court_id, start_ms, end_ms in bookings:
+            if court_label not in court_bookings:
+                court_bookings[court_label] = CourtSchedule(court_id, tz_obj)
+            court_bookings[court_label].add(start_ms, end_ms)
 
         return court_bookings
 
-    @staticmethod
-    def _merge_bookings(bookings: list) -> list:
-        """Merge contiguous bookings
+    def verify_reservation(self, court_id: str, start: datetime, end: datetime) -> str:
+        """Looks for a booking of the court for exactly the given time window made by
+            the logged in member. Only the booked court is requested, using cached
+            court selection criteria. When listing was skipped the criteria are not
+            cached yet, and the Bookings page is requested first.
 
         Args:
-            bookings (list): List of start and end times
+            court_id (str): Court id
+            start (datetime): Reservation start date and time
+            end (datetime): Reservation end date and time
 
         Returns:
-            List of merged bookings
+            (str) RESERVATION_CONFIRMED, RESERVATION_NOT_FOUND, or RESERVATION_UNKNOWN
+                    when a matching booking does not show which member made it
         """
-        if not bookings:
-            return bookings
-
-        # Sort by start time
-        _bookings = bookings.copy()
-        _bookings.sort(key=lambda x: x[0])
-        merged_list = [(_bookings[0])]
-
-        for current_start_time, current_end_time in _bookings[1:]:
-            # check if the current start time is less than the end time of the
-            # latest end time in the merged list
-            last_merged_start, last_merged_end = merged_list[-1]
-
-            if current_start_time <= last_merged_end:
-                merged_list[-1] = (
-                    last_merged_start,
-                    max(current_end_time, last_merged_end),
-                )
-            else:
-                merged_list.append((current_start_time, current_end_time))
-
-        return merged_list
+        criteria = self._court_criteria(CRITICAL)
+        response = self._read_expanded(start, str(court_id), CRITICAL)
+        slot = Slot.from_datetimes(start, end)
+        return self._parse(
+            partial(
+                parsers.parse_reservation_match,
+                court_id=str(court_id),
+                start_ms=slot.start_ms,
+                end_ms=slot.end_ms,
+                member_id=criteria["member_id"],
+            ),
+            response,
+        )
 
     def create_reservation(
         self,
@@ -266,7 +339,9 @@ class CourtReserveAdapter:
 
         Raises:
             AssertionError when reservation creation fails
+            BudgetExceededError when there is not enough time left to make the reservation
         """
+        self._enter_phase("prepare")
         path = f"Reservations/CreateReservationCourtsview/{self.org_id}"
         params = {
             "start": start.strftime("%a %b %d %Y %H:%M:%S GMT%z (%Z)"),
@@ -275,21 +350,15 @@ class CourtReserveAdapter:
             "customSchedulerId": self.session_id,
         }
         response = self._request("GET", path, params=params, headers=self.http_headers)
-        soup = BeautifulSoup(response.text, "html.parser")
-
-        # Check if a reservation has already been made
-        has_max_courts = (
-            str(soup.find("p", class_="confirm-message")).find(
-                "reached max number of courts allowed"
-            )
-            != -1
-        )
-        assert not has_max_courts, "Max number of courts allowed already reserved."
+        form = self._parse(parsers.parse_reservation_form, response)
+        assert not form[
+            "has_max_courts"
+        ], "Max number of courts allowed already reserved."
 
-        token = soup.select_one("#createReservation-Form input")["value"]
-        court_id = soup.find("input", id="CourtId")["value"]
-        member_id = soup.find("input", id="MemberId")["value"]
-        membership_id = soup.find("input", id="MembershipId")["value"]
+        token = form["token"]
+        court_id = form["court_id"]
+        member_id = form["member_id"]
+        membership_id = form["membership_id"]
 
         # Get organizing player details
         path = f"AjaxController/CalculateReservationCostMemberPortal/{self.org_id}"
@@ -305,15 +374,11 @@ class CourtReserveAdapter:
             "MembersString": [],
         }
         response = self._request("POST", path, data=payload, headers=self.http_headers)
-        soup = BeautifulSoup(json.loads(response.text)["memberTable"], "html.parser")
-        org_member_id = soup.find("input", id="SelectedMembers_0__OrgMemberId")["value"]
-        member0_firstname = soup.find("input", id=f"hidden-firstname_{org_member_id}")[
-            "value"
-        ]
-        member0_lastname = soup.find("input", id=f"hidden-lastname_{org_member_id}")[
-            "value"
-        ]
-        member0_email = soup.find("input", id=f"hidden-email_{org_member_id}")["value"]
+        member0 = self._parse(parsers.parse_organizing_member, response)
+        org_member_id = member0["org_member_id"]
+        member0_firstname = member0["first_name"]
+        member0_lastname = member0["last_name"]
+        member0_email = member0["email"]
 
         # Get additional player details
         # TODO Add support for doubles
@@ -329,7 +394,7 @@ class CourtReserveAdapter:
             "filter[logic]": "and",
         }
         response = self._request("GET", path, params=params, headers=self.http_headers)
-        player2 = json.loads(response.text)[0]
+        player2 = self._parse(parsers.parse_player, response)
 
         payload = (
             f"__RequestVerificationToken={token}&"
@@ -393,10 +458,23 @@ class CourtReserveAdapter:
             logger.debug("Reservation payload: %s", payload)
             return
 
+        self._enter_phase("post")
         path = f"Reservations/CreateReservation/{self.org_id}"
-        response = self._request("POST", path, data=payload, headers=self.http_headers)
-        json_resp = json.loads(response.text)
-
-        assert json_resp["isValid"]
+        try:
+            response = self._request(
+                "POST", path, data=payload, headers=self.http_headers, priority=CRITICAL
+            )
+            is_valid = self._parse(parsers.parse_reservation_result, response)
+        except (requests.exceptions.RequestException, ValueError) as err:
+            # The reservation may have been created even though the response was lost
+            logger.warning("Reservation response not received: %s", err)
+            self._enter_phase("verify")
+            match = self.verify_reservation(court_id, start, end)
+            assert (
+                match != parsers.RESERVATION_UNKNOWN
+            ), "Court is booked, but the reservation could not be attributed."
+            assert match == parsers.RESERVATION_CONFIRMED, "Reservation not found."
+        else:
+            assert is_valid
 
         logger.info("%s reserved at %s", court, start.strftime("%I:%M %p %Z"))
@@ -8,6 +8,9 @@ from dateutil import tz
 import boto3
 from botocore.exceptions import ClientError
 
+from budget import BudgetExceededError
+from models import Preference
+
 logging.config.fileConfig(fname="logging.conf", disable_existing_loggers=False)
 logger = logging.getLogger(__name__)
 
@@ -68,7 +71,7 @@ def court_preferences(preferences, booking_date):
         booking_date (datetime): Datetime to reserve a court
 
     Returns:
-        (list) List of court and booking time ordered by preference for the booking date
+        (list) List of Preference ordered by preference for the booking date
     """
 
     def str_to_date(hour_min):
@@ -91,7 +94,7 @@ def court_preferences(preferences, booking_date):
         weekday_name,
     )
     return [
-        (court, (str_to_date(start), str_to_date(end)))
+        Preference(court, str_to_date(start), str_to_date(end))
         for start, end in start_end_times
         for court in courts
     ]
@@ -102,30 +105,65 @@ def find_open_court(bookings, preferences):
         and returns the first open court found
 
     Args:
-        bookings (dict): Court bookings grouped by court label
-        preferences (list): List of court and time preferences
+        bookings (dict): Court schedule grouped by court label
+        preferences (list): List of Preference
 
     Returns:
         (tuple) Court label, start datetime, end datetime
         (None) Returns None when an open court is not found
     """
-    for court, pref_start_end in preferences:
-        pref_start, pref_end = pref_start_end
-        conflict = False
+    for preference in preferences:
+        schedule = bookings.get(preference.court)
         # No existing bookings found for the court
-        if not bookings.get(court):
-            return (court, pref_start, pref_end)
-        for booked_start, booked_end in bookings[court]["start_end_times"]:
-            if pref_end > booked_start and pref_start < booked_end:
-                conflict = True
-        if not conflict:
+        if not schedule:
+            return (preference.court, preference.start, preference.end)
+        if not schedule.overlaps(preference.slot):
             logger.info(
                 "%s is open from %s to %s",
-                court,
-                pref_start.strftime("%I:%M %p"),
-                pref_end.strftime("%I:%M %p"),
+                preference.court,
+                preference.start.strftime("%I:%M %p"),
+                preference.end.strftime("%I:%M %p"),
             )
-            return (court, pref_start, pref_end)
+            return (preference.court, preference.start, preference.end)
 
     logger.info("Open court not found.")
     return None
+
+
+def book_open_court(
+    court_reserve, preferences, booking_date, players, dry_run=False, list_bookings=True
+):
+    """Finds the first open court in the user preferences and reserves it
+
+    Args:
+        court_reserve (CourtReserveAdapter): Adapter used to list and create reservations
+        preferences (list): List of Preference
+        booking_date (datetime): Datetime to reserve a court
+        players (list): List of player names (i.e. ["Naomi Osaka"])
+        dry_run (bool): Defaults to False. When dry run mode is enabled a reservation is
+                        not created.
+        list_bookings (bool): Defaults to True. When False, or when listing runs out
+                        of time, existing reservations are not used and the first
+                        preference is attempted.
+
+    Returns:
+        (tuple) Court label, start datetime, end datetime
+        (None) Returns None when an open court is not found
+
+    Raises:
+        AssertionError when reservation creation fails
+    """
+    bookings = {}
+    if list_bookings:
+        try:
+            bookings = court_reserve.list_reservations(date=booking_date)
+        except BudgetExceededError as err:
+            logger.warning("Listing reservations stopped: %s", err)
+
+    open_court = find_open_court(bookings, preferences)
+    if not open_court:
+        return None
+
+    court, start, end = open_court
+    court_reserve.create_reservation(court, start, end, players, dry_run)
+    return open_court
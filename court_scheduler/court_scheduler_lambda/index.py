@@ -6,9 +6,12 @@ import os
 import json
 
 from botocore.exceptions import ClientError
+from requests.exceptions import RequestException
 
+from budget import ExecutionBudget, BudgetExceededError
 from court_reserve import CourtReserveAdapter
-from helpers import get_secret_value, offset_today, court_preferences, find_open_court
+from ratelimit import RateLimiter, FileLockBackend
+from helpers import get_secret_value, offset_today, court_preferences, book_open_court
 
 logging.config.fileConfig(fname="logging.conf", disable_existing_loggers=False)
 logger = logging.getLogger(__name__)
@@ -16,6 +19,9 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 CONFIG = {**os.environ}
 
+# Shared by warm invocations and other processes on the same host
+RATE_LIMITER = RateLimiter(FileLockBackend())
+
 
 def handler(event=None, context=None):
     """Lambda function handler
@@ -28,6 +34,7 @@ def handler(event=None, context=None):
         (dict) Response
     """
     dry_run = CONFIG["DRY_RUN"].lower() == "true"
+    budget = ExecutionBudget(context)
     response = {
         "statusCode": 200,
         "headers": {"Content-Type": "application/json"},
@@ -49,19 +56,28 @@ def handler(event=None, context=None):
             org_id=settings["ORG_ID"],
             username=settings["USERNAME"],
             password=settings["PASSWORD"],
+            budget=budget,
+            rate_limiter=RATE_LIMITER,
         )
-        bookings = court_reserve.list_reservations(date=booking_date)
 
-        # Find open court
-        open_court = find_open_court(bookings, preferences)
+        # Find an open court and create a reservation. Listing existing reservations
+        # is skipped when it would not leave enough time to book.
+        players = settings["PREFERENCES_V2"][weekday_name]["players"]
+        list_bookings = budget.allows("list")
+        if not list_bookings:
+            logger.warning("Skipping reservation listing. Time remaining is too short.")
+        open_court = book_open_court(
+            court_reserve,
+            preferences,
+            booking_date,
+            players,
+            dry_run=dry_run,
+            list_bookings=list_bookings,
+        )
         if not open_court:
             response["body"]["message"] = f"No open court found for {weekday_name}"
             return response
-
-        # Create reservation
-        players = settings["PREFERENCES_V2"][weekday_name]["players"]
-        court, start, end = open_court
-        court_reserve.create_reservation(court, start, end, players, dry_run)
+        court, start, _ = open_court
 
     except KeyError as err:
         logger.exception(err)
@@ -79,6 +95,14 @@ def handler(event=None, context=None):
         logger.exception(err)
         response["statusCode"] = 500
         response["body"]["message"] = f"{err}"
+    except BudgetExceededError as err:
+        logger.exception(err)
+        response["statusCode"] = 500
+        response["body"]["message"] = f"{err}"
+    except RequestException as err:
+        logger.exception(err)
+        response["statusCode"] = 500
+        response["body"]["message"] = f"{err}"
     else:
         if dry_run:
             response["body"][
@@ -0,0 +1,174 @@
+""" Court booking and preference records
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+
+def to_epoch_ms(_dt: datetime) -> int:
+    """Returns a timezone aware datetime as milliseconds since the epoch"""
+    return round(_dt.timestamp() * 1000)
+
+
+def from_epoch_ms(epoch_ms: int, tz_obj=None) -> datetime:
+    """Returns a datetime from milliseconds since the epoch"""
+    return datetime.fromtimestamp(epoch_ms / 1000, tz=tz_obj)
+
+
+class Slot:
+    """Start and end time of a booking, in milliseconds since the epoch"""
+
+    __slots__ = ("start_ms", "end_ms")
+
+    def __init__(self, start_ms: int, end_ms: int) -> None:
+        """
+        Args:
+            start_ms (int): Start time in milliseconds since the epoch
+            end_ms (int): End time in milliseconds since the epoch
+
+        Returns:
+            None
+        """
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+
+    @classmethod
+    def from_datetimes(cls, start: datetime, end: datetime) -> "Slot":
+        """Returns a slot from timezone aware start and end datetimes"""
+        return cls(to_epoch_ms(start), to_epoch_ms(end))
+
+    def to_datetimes(self, tz_obj=None) -> tuple:
+        """Returns the start and end datetime of the slot"""
+        return (
+            from_epoch_ms(self.start_ms, tz_obj),
+            from_epoch_ms(self.end_ms, tz_obj),
+        )
+
+    def overlaps(self, other: "Slot") -> bool:
+        """Returns True when the slots share any time"""
+        return self.end_ms > other.start_ms and self.start_ms < other.end_ms
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Slot):
+            return NotImplemented
+        return (self.start_ms, self.end_ms) == (other.start_ms, other.end_ms)
+
+    def __repr__(self) -> str:
+        return f"Slot({self.start_ms}, {self.end_ms})"
+
+
+class Preference:
+    """Court label and booking time preferred by the user"""
+
+    __slots__ = ("court", "start", "end", "slot")
+
+    def __init__(self, court: str, start: datetime, end: datetime) -> None:
+        """
+        Args:
+            court (str): Court label (i.e. "Court #1")
+            start (datetime): Preferred start date and time
+            end (datetime): Preferred end date and time
+
+        Returns:
+            None
+        """
+        self.court = court
+        self.start = start
+        self.end = end
+        self.slot = Slot.from_datetimes(start, end)
+
+    @classmethod
+    def from_tuple(cls, preference: tuple) -> "Preference":
+        """Returns a preference from a (court, (start, end)) tuple"""
+        court, (start, end) = preference
+        return cls(court, start, end)
+
+    def to_tuple(self) -> tuple:
+        """Returns the preference as a (court, (start, end)) tuple"""
+        return (self.court, (self.start, self.end))
+
+    def __repr__(self) -> str:
+        return f"Preference({self.court!r}, {self.start!r}, {self.end!r})"
+
+
+class CourtSchedule:
+    """Bookings for a single court, kept as sorted and merged arrays of start
+    and end times in milliseconds since the epoch
+    """
+
+    __slots__ = ("court_id", "tz_obj", "starts", "ends")
+
+    def __init__(self, court_id=None, tz_obj=None) -> None:
+        """
+        Args:
+            court_id (int): Court id
+            tz_obj (tzinfo): Time zone used when converting bookings to datetimes
+
+        Returns:
+            None
+        """
+        self.court_id = court_id
+        self.tz_obj = tz_obj
+        self.starts = array("q")
+        self.ends = array("q")
+
+    def add(self, start_ms: int, end_ms: int) -> None:
+        """Adds a booking, merging it in place with overlapping or contiguous bookings
+
+        Args:
+            start_ms (int): Start time in milliseconds since the epoch
+            end_ms (int): End time in milliseconds since the epoch
+
+        Returns:
+            None
+        """
+        # First booking ending at or after the new start, and first booking starting
+        # after the new end. Bookings in between are merged with the new booking.
+        first = bisect_left(self.ends, start_ms)
+        last = bisect_right(self.starts, end_ms)
+        if first < last:
+            start_ms = min(start_ms, self.starts[first])
+            end_ms = max(end_ms, self.ends[last - 1])
+            del self.starts[first:last]
+            del self.ends[first:last]
+        self.starts.insert(first, start_ms)
+        self.ends.insert(first, end_ms)
+
+    def overlaps(self, slot: Slot) -> bool:
+        """Returns True when any booking shares time with the slot"""
+        index = bisect_right(self.ends, slot.start_ms)
+        return index < len(self.starts) and self.starts[index] < slot.end_ms
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __iter__(self):
+        for start_ms, end_ms in zip(self.starts, self.ends):
+            yield Slot(start_ms, end_ms)
+
+    def to_dict(self) -> dict:
+        """Returns the schedule in the court bookings dict format
+
+        Returns:
+            (dict) Court id and a list of start and end datetime the court is reserved
+        """
+        return {
+            "court_id": self.court_id,
+            "start_end_times": [slot.to_datetimes(self.tz_obj) for slot in self],
+        }
+
+    @classmethod
+    def from_dict(cls, court_bookings: dict, tz_obj=None) -> "CourtSchedule":
+        """Returns a schedule from the court bookings dict format
+
+        Args:
+            court_bookings (dict): Court id and a list of start and end datetime
+            tz_obj (tzinfo): Time zone used when converting bookings to datetimes
+
+        Returns:
+            (CourtSchedule)
+        """
+        schedule = cls(court_bookings["court_id"], tz_obj)
+        for start, end in court_bookings["start_end_times"]:
+            schedule.add(to_epoch_ms(start), to_epoch_ms(end))
+        return schedule
@@ -0,0 +1,261 @@
+""" app.court.reserve.com response parsers
+
+Parsers take the raw response body and return small, picklable results so
+they can run in a separate process.
+"""
+import json
+import re
+
+from bs4 import BeautifulSoup
+
+TOKEN_NAME = "__RequestVerificationToken"
+
+# Results of matching a reservation in a ReadExpanded response
+RESERVATION_CONFIRMED = "confirmed"
+RESERVATION_NOT_FOUND = "not_found"
+RESERVATION_UNKNOWN = "unknown"
+
+# ReadExpanded booking fields that may identify the member who made a booking
+MEMBER_FIELDS = ("MemberId", "MemberIds")
+
+
+def parse_login_token(content: bytes) -> str:
+    """Returns the hidden request verification token from the login page
+
+    Args:
+        content (bytes): Login page body
+
+    Returns:
+        (str) Request verification token
+    """
+    soup = BeautifulSoup(content, "html.parser")
+    return soup.find(id="loginForm").find(attrs={"name": TOKEN_NAME})["value"]
+
+
+def parse_session_id(content: bytes) -> str:
+    """Returns the session id from the page shown after login
+
+    Args:
+        content (bytes): Page body
+
+    Returns:
+        (str) Session id
+    """
+    soup = BeautifulSoup(content, "html.parser")
+    bookings_path = soup.select_one("#respMenu li:nth-child(2) li a")["href"]
+    return re.search("sId=([0-9]+)", bookings_path).group(1)
+
+
+def parse_court_criteria(content: bytes) -> dict:
+    """Returns court selection criteria from the Bookings page
+
+    Args:
+        content (bytes): Bookings page body
+
+    Returns:
+        (dict) Time zone, cost type id, selected court ids and member id
+    """
+    pattern = re.compile(r"getSelectedCriteriasCourtsView\(\)")
+    soup = BeautifulSoup(content, "html.parser")
+    court_criteria = [
+        str(script.string)
+        for script in soup.select(
+            "#expanded-page div.content div.row div.col-lg-12 script"
+        )
+        if pattern.search(str(script.string)) is not None
+    ][0]
+    time_zone = re.search(r"TimeZone: '([A-Za-z_\/]+)'", court_criteria).group(1)
+    cost_type_id = re.search("CostTypeId: '([0-9]+)'", court_criteria).group(1)
+    court_ids = re.search("SelectedCourtIds: '([0-9,]+)'", court_criteria).group(1)
+    member_id = re.search("MemberIds: '([0-9]+)'", court_criteria).group(1)
+    return {
+        "time_zone": time_zone,
+        "cost_type_id": cost_type_id,
+        "court_ids": court_ids,
+        "member_id": member_id,
+    }
+
+
+def parse_bookings(content: bytes) -> list:
+    """Returns bookings from a ReadExpanded response
+
+    Args:
+        content (bytes): ReadExpanded JSON body
+
+    Returns:
+        (list) Court label, court id, start and end time in milliseconds since the
+                epoch for each booking
+    """
+    return extract_bookings(json.loads(content)["Data"])
+
+
+def extract_bookings(data: list) -> list:
+    """Returns bookings from the Data list of a ReadExpanded response
+
+    Args:
+        data (list): Bookings with CourtLabel, CourtId, Start and End
+
+    Returns:
+        (list) Court label, court id, start and end time in milliseconds since the
+                epoch for each booking
+    """
+    epoch_re = re.compile("[0-9]+")
+    return [
+        (
+            str(booking["CourtLabel"]),
+            booking["CourtId"],
+            int(epoch_re.search(booking["Start"]).group(0)),
+            int(epoch_re.search(booking["End"]).group(0)),
+        )
+        for booking in data
+    ]
+
+
+def parse_reservation_match(
+    content: bytes, court_id: str, start_ms: int, end_ms: int, member_id: str
+) -> str:
+    """Returns whether a ReadExpanded response has a booking of the court for exactly
+        the given time window made by the member
+
+    Args:
+        content (bytes): ReadExpanded JSON body
+        court_id (str): Court id
+        start_ms (int): Start time in milliseconds since the epoch
+        end_ms (int): End time in milliseconds since the epoch
+        member_id (str): Member id
+
+    Returns:
+        (str) RESERVATION_CONFIRMED when the booking was made by the member,
+                RESERVATION_NOT_FOUND when there is no matching booking or it was made
+                by another member, RESERVATION_UNKNOWN when a matching booking does not
+                show which member made it
+    """
+    data = json.loads(content)["Data"]
+    matches = [
+        booking
+        for booking, (_, booked_court_id, booked_start, booked_end) in zip(
+            data, extract_bookings(data)
+        )
+        if str(booked_court_id) == court_id
+        and booked_start == start_ms
+        and booked_end == end_ms
+    ]
+    if not matches:
+        return RESERVATION_NOT_FOUND
+
+    result = RESERVATION_NOT_FOUND
+    for booking in matches:
+        members = [
+            _member_ids(booking[field]) for field in MEMBER_FIELDS if field in booking
+        ]
+        if any(member_ids and member_id in member_ids for member_ids in members):
+            return RESERVATION_CONFIRMED
+        if not members or not all(members):
+            result = RESERVATION_UNKNOWN
+    return result
+
+
+def _member_ids(value) -> list:
+    """Returns member ids from a ReadExpanded member field
+
+    Args:
+        value: Member id, comma separated member ids, or a list of member ids
+
+    Returns:
+        (list) Member ids as strings. Empty when the value cannot be read.
+    """
+    if isinstance(value, bool) or value is None:
+        return []
+    if isinstance(value, int):
+        return [str(value)]
+    if isinstance(value, str):
+        return [member.strip() for member in value.split(",") if member.strip()]
+    if isinstance(value, list):
+        member_ids = []
+        for member in value:
+            member_ids.extend(_member_ids(member))
+        return member_ids
+    return []
+
+
+def parse_reservation_form(content: bytes) -> dict:
+    """Returns hidden inputs from the create reservation form
+
+    Args:
+        content (bytes): Create reservation form body
+
+    Returns:
+        (dict) Whether the max number of courts is reached, and the request
+                verification token, court id, member id and membership id. Only
+                has_max_courts is set when the max number of courts is reached.
+    """
+    soup = BeautifulSoup(content, "html.parser")
+
+    # Check if a reservation has already been made
+    has_max_courts = (
+        str(soup.find("p", class_="confirm-message")).find(
+            "reached max number of courts allowed"
+        )
+        != -1
+    )
+    if has_max_courts:
+        return {"has_max_courts": True}
+
+    return {
+        "has_max_courts": False,
+        "token": soup.select_one("#createReservation-Form input")["value"],
+        "court_id": soup.find("input", id="CourtId")["value"],
+        "member_id": soup.find("input", id="MemberId")["value"],
+        "membership_id": soup.find("input", id="MembershipId")["value"],
+    }
+
+
+def parse_organizing_member(content: bytes) -> dict:
+    """Returns organizing player details from a reservation cost response
+
+    Args:
+        content (bytes): CalculateReservationCostMemberPortal JSON body
+
+    Returns:
+        (dict) Organization member id, first name, last name and email
+    """
+    soup = BeautifulSoup(json.loads(content)["memberTable"], "html.parser")
+    org_member_id = soup.find("input", id="SelectedMembers_0__OrgMemberId")["value"]
+    return {
+        "org_member_id": org_member_id,
+        "first_name": soup.find("input", id=f"hidden-firstname_{org_member_id}")[
+            "value"
+        ],
+        "last_name": soup.find("input", id=f"hidden-lastname_{org_member_id}")["value"],
+        "email": soup.find("input", id=f"hidden-email_{org_member_id}")["value"],
+    }
+
+
+def parse_player(content: bytes) -> dict:
+    """Returns details of the first player found by a member search
+
+    Args:
+        content (bytes): GetMembersToPlayWith JSON body
+
+    Returns:
+        (dict) Member org id, member id, first name and last name
+    """
+    player = json.loads(content)[0]
+    return {
+        "MemberOrgId": player["MemberOrgId"],
+        "MemberId": player["MemberId"],
+        "FirstName": player["FirstName"],
+        "LastName": player["LastName"],
+    }
+
+
+def parse_reservation_result(content: bytes) -> bool:
+    """Returns whether a reservation was created
+
+    Args:
+        content (bytes): CreateReservation JSON body
+
+    Returns:
+        (bool) True when the reservation is valid
+    """
+    return bool(json.loads(content)["isValid"])
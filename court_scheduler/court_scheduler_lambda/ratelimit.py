@@ -0,0 +1,249 @@
+""" Token bucket rate limiter shared by accounts and workers
+"""
+import fcntl
+import json
+import logging
+import logging.config
+import os
+import tempfile
+import threading
+import time
+
+logging.config.fileConfig(fname="logging.conf", disable_existing_loggers=False)
+logger = logging.getLogger(__name__)
+
+# Request priorities, highest first
+CRITICAL = 0
+INTERACTIVE = 1
+BACKGROUND = 2
+
+# Fraction of bucket capacity that lower priorities leave for higher priorities
+PRIORITY_FLOORS = {CRITICAL: 0.0, INTERACTIVE: 0.25, BACKGROUND: 0.5}
+
+# Status codes that slow down requests to a host
+BACKOFF_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class LocalBackend:
+    """Keeps bucket state in memory, shared by threads of a single process"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._state = {}
+
+    def transact(self, update):
+        """Applies an update to the bucket state while holding the lock
+
+        Args:
+            update (function): Called with the state dict, which it changes in place
+
+        Returns:
+            Result of update
+        """
+        with self._lock:
+            return update(self._state)
+
+
+class FileLockBackend:
+    """Keeps bucket state in a JSON file, shared by processes on the same host"""
+
+    def __init__(self, path: str = "/tmp/court_reserve_rate_limit.json") -> None:
+        """
+        Args:
+            path (str): State file path. Created when it does not exist. A lock file
+                        is kept next to it.
+
+        Returns:
+            None
+        """
+        self.path = path
+        self.lock_path = f"{path}.lock"
+
+    def _read(self) -> dict:
+        """Returns the bucket state, or an empty state when the file is missing or
+        unreadable
+        """
+        try:
+            with open(self.path, encoding="utf-8") as state_file:
+                return json.load(state_file)
+        except FileNotFoundError:
+            return {}
+        except ValueError as err:
+            logger.warning("Discarding unreadable rate limit state: %s", err)
+            return {}
+
+    def _write(self, state: dict) -> None:
+        """Replaces the state file, so readers never see a partly written file"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "w", encoding="utf-8") as temp_file:
+                json.dump(state, temp_file)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def transact(self, update):
+        """Applies an update to the bucket state while holding an exclusive file lock
+
+        Args:
+            update (function): Called with the state dict, which it changes in place
+
+        Returns:
+            Result of update
+        """
+        with open(self.lock_path, "a", encoding="utf-8") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                state = self._read()
+                result = update(state)
+                self._write(state)
+                return result
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class RateLimiter:
+    """Token bucket rate limiter per host and per account with priority classes
+    and adaptive backoff
+    """
+
+    def __init__(
+        self,
+        backend=None,
+        host_rate: float = 5.0,
+        host_capacity: float = 20.0,
+        account_rate: float = 1.0,
+        account_capacity: float = 16.0,
+        backoff_seconds: float = 2.0,
+        min_scale: float = 0.1,
+    ) -> None:
+        """
+        Args:
+            backend (object): LocalBackend or FileLockBackend. Defaults to LocalBackend.
+            host_rate (float): Requests per second to a host
+            host_capacity (float): Burst size for a host
+            account_rate (float): Requests per second for an account
+            account_capacity (float): Burst size for an account. The default covers
+                                        a whole booking run, so a single account
+                                        does not wait while the floors of lower
+                                        priorities are applied
+            backoff_seconds (float): Pause after a throttled or failed response, used
+                                        when the response has no Retry-After header
+            min_scale (float): Lowest fraction of the rate used after backing off
+
+        Returns:
+            None
+        """
+        self.backend = backend or LocalBackend()
+        self.limits = {
+            "host": (host_rate, host_capacity),
+            "account": (account_rate, account_capacity),
+        }
+        self.backoff_seconds = backoff_seconds
+        self.min_scale = min_scale
+
+    def _buckets(self, state: dict, host: str, account: str) -> list:
+        """Returns bucket state and limits for the host and account, refilled to now"""
+        now = time.time()
+        buckets = []
+        for kind, name in (("host", host), ("account", account)):
+            rate, capacity = self.limits[kind]
+            bucket = state.setdefault(
+                f"{kind}:{name}",
+                {"tokens": capacity, "updated": now, "scale": 1.0, "blocked_until": 0},
+            )
+            elapsed = max(now - bucket["updated"], 0)
+            bucket["tokens"] = min(
+                capacity, bucket["tokens"] + elapsed * rate * bucket["scale"]
+            )
+            bucket["updated"] = now
+            buckets.append((bucket, rate, capacity))
+        return buckets
+
+    def _try_acquire(self, host: str, account: str, priority: int) -> float:
+        """Takes a token from the host and account buckets when both have one
+
+        Returns:
+            (float) 0 when tokens were taken, otherwise seconds to wait before retrying
+        """
+
+        def update(state):
+            now = time.time()
+            wait = 0
+            buckets = self._buckets(state, host, account)
+            for bucket, rate, capacity in buckets:
+                # Critical requests are not held back by backoff
+                if priority != CRITICAL and bucket["blocked_until"] > now:
+                    wait = max(wait, bucket["blocked_until"] - now)
+                required = 1 + PRIORITY_FLOORS[priority] * capacity
+                if bucket["tokens"] < required:
+                    wait = max(
+                        wait, (required - bucket["tokens"]) / (rate * bucket["scale"])
+                    )
+            if wait == 0:
+                for bucket, _, _ in buckets:
+                    bucket["tokens"] -= 1
+            return wait
+
+        return self.backend.transact(update)
+
+    def acquire(
+        self, host: str, account: str, priority: int = INTERACTIVE, timeout=None
+    ) -> bool:
+        """Waits until a request may be sent
+
+        Args:
+            host (str): Host name
+            account (str): Account identifier
+            priority (int): CRITICAL, INTERACTIVE or BACKGROUND
+            timeout (float): Seconds to wait at most. Waits indefinitely when None.
+
+        Returns:
+            (bool) False when the timeout expired before a request could be sent
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._try_acquire(host, account, priority)
+            if wait == 0:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            logger.debug("Rate limited. Waiting %.2f seconds", wait)
+            time.sleep(wait)
+
+    def record(
+        self, host: str, account: str, status_code: int, retry_after: str = None
+    ) -> None:
+        """Adapts request rates to a response
+
+        Args:
+            host (str): Host name
+            account (str): Account identifier
+            status_code (int): Response status code
+            retry_after (str): Retry-After response header
+
+        Returns:
+            None
+        """
+        throttled = status_code in BACKOFF_STATUS_CODES
+        pause = self.backoff_seconds
+        if retry_after and retry_after.isdigit():
+            pause = float(retry_after)
+
+        def update(state):
+            now = time.time()
+            for bucket, _, _ in self._buckets(state, host, account):
+                if throttled:
+                    bucket["scale"] = max(self.min_scale, bucket["scale"] / 2)
+                    bucket["blocked_until"] = max(bucket["blocked_until"], now + pause)
+                else:
+                    bucket["scale"] = min(1.0, bucket["scale"] + 0.1)
+
+        if throttled:
+            logger.warning("Received %s from %s. Backing off.", status_code, host)
+        self.backend.transact(update)
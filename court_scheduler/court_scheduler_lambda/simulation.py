@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+""" Replays recorded booking days through the booking flow without network access
+
+Each line of a days file is a JSON object recorded for one booking day:
+    {
+        "date": "2021-10-13",
+        "time_zone": "America/Los_Angeles",
+        "bookings": [<ReadExpanded Data entries when the booking window opens>],
+        "competitors": [
+            {"at_ms": 350, "CourtLabel": "Court #1", "CourtId": 1,
+             "Start": "/Date(1634151600000)/", "End": "/Date(1634155200000)/"}
+        ]
+    }
+at_ms is the time after the booking window opens that a competing booking was made.
+
+A strategies file is a JSON list of strategies:
+    [{"name": "fast", "preferences": <PREFERENCES_V2>, "start_delay_ms": 0,
+      "list_latency_ms": 600, "create_latency_ms": 1500, "list_bookings": true}]
+
+Usage:
+    python simulation.py days.jsonl strategies.json
+"""
+import argparse
+import json
+import logging
+import logging.config
+import time
+from datetime import datetime
+
+from dateutil import tz
+
+from helpers import court_preferences, book_open_court
+from models import CourtSchedule, Slot
+from parsers import extract_bookings
+
+logging.config.fileConfig(fname="logging.conf", disable_existing_loggers=False)
+logger = logging.getLogger(__name__)
+
+OUTCOMES = ("booked", "conflict", "no_open_court", "no_preferences")
+
+
+class SimulatedDay:
+    """Recorded bookings and competing bookings for one booking day"""
+
+    __slots__ = ("booking_date", "tz_obj", "bookings", "competitors")
+
+    def __init__(self, record: dict) -> None:
+        """
+        Args:
+            record (dict): Recorded booking day
+
+        Returns:
+            None
+        """
+        self.tz_obj = tz.gettz(record["time_zone"])
+        self.booking_date = datetime.strptime(record["date"], "%Y-%m-%d").replace(
+            tzinfo=self.tz_obj
+        )
+        self.bookings = extract_bookings(record["bookings"])
+        competitors = sorted(record.get("competitors", []), key=lambda x: x["at_ms"])
+        self.competitors = list(
+            zip(
+                [competitor["at_ms"] for competitor in competitors],
+                extract_bookings(competitors),
+            )
+        )
+
+    def schedules(self, clock_ms: int) -> dict:
+        """Returns court schedules as seen at the given time
+
+        Args:
+            clock_ms (int): Milliseconds after the booking window opens
+
+        Returns:
+            (dict) Court schedule for each court label
+        """
+        court_bookings = {}
+        visible = self.bookings + [
+            booking for at_ms, booking in self.competitors if at_ms <= clock_ms
+        ]
+        for court_label, court_id, start_ms, end_ms in visible:
+            if court_label not in court_bookings:
+                court_bookings[court_label] = CourtSchedule(court_id, self.tz_obj)
+            court_bookings[court_label].add(start_ms, end_ms)
+        return court_bookings
+
+
+class Strategy:
+    """Court preferences and timing settings to evaluate"""
+
+    __slots__ = (
+        "name",
+        "preferences",
+        "start_delay_ms",
+        "list_latency_ms",
+        "create_latency_ms",
+        "list_bookings",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        preferences: dict,
+        start_delay_ms: int = 0,
+        list_latency_ms: int = 600,
+        create_latency_ms: int = 1500,
+        list_bookings: bool = True,
+    ) -> None:
+        """
+        Args:
+            name (str): Strategy name
+            preferences (dict): Court preferences in the PREFERENCES_V2 format
+            start_delay_ms (int): Time after the booking window opens that booking starts
+            list_latency_ms (int): Time taken to list existing reservations
+            create_latency_ms (int): Time taken to create a reservation
+            list_bookings (bool): When False, the first preference is attempted
+                                    without listing existing reservations
+
+        Returns:
+            None
+        """
+        self.name = name
+        self.preferences = preferences
+        self.start_delay_ms = start_delay_ms
+        self.list_latency_ms = list_latency_ms
+        self.create_latency_ms = create_latency_ms
+        self.list_bookings = list_bookings
+
+
+class SimulatedAdapter:
+    """Stands in for CourtReserveAdapter, advancing a simulated clock instead of
+    sending requests
+    """
+
+    def __init__(self, day: SimulatedDay, strategy: Strategy) -> None:
+        """
+        Args:
+            day (SimulatedDay): Recorded booking day
+            strategy (Strategy): Strategy being evaluated
+
+        Returns:
+            None
+        """
+        self.day = day
+        self.strategy = strategy
+        self.clock_ms = strategy.start_delay_ms
+
+    def list_reservations(self, date: datetime) -> dict:
+        """Returns court schedules as seen when the listing response is received"""
+        self.clock_ms += self.strategy.list_latency_ms
+        return self.day.schedules(self.clock_ms)
+
+    def create_reservation(
+        self,
+        court: str,
+        start: datetime,
+        end: datetime,
+        players: list,
+        dry_run: bool = False,
+    ) -> None:
+        """Creates a court reservation when the court is still open when the
+        reservation request is received
+
+        Raises:
+            AssertionError when the court was reserved first by a competitor
+        """
+        self.clock_ms += self.strategy.create_latency_ms
+        schedule = self.day.schedules(self.clock_ms).get(court)
+        assert not (
+            schedule and schedule.overlaps(Slot.from_datetimes(start, end))
+        ), f"{court} already reserved."
+
+
+def simulate_day(day: SimulatedDay, strategy: Strategy) -> tuple:
+    """Runs the booking flow for one recorded day
+
+    Args:
+        day (SimulatedDay): Recorded booking day
+        strategy (Strategy): Strategy being evaluated
+
+    Returns:
+        (tuple) Outcome and the rank of the booked preference, or None when a court
+                was not booked
+    """
+    preferences = court_preferences(strategy.preferences, day.booking_date)
+    if not preferences:
+        return ("no_preferences", None)
+
+    court_reserve = SimulatedAdapter(day, strategy)
+    try:
+        open_court = book_open_court(
+            court_reserve,
+            preferences,
+            day.booking_date,
+            players=[],
+            list_bookings=strategy.list_bookings,
+        )
+    except AssertionError:
+        return ("conflict", None)
+    if not open_court:
+        return ("no_open_court", None)
+
+    court, start, _ = open_court
+    rank = next(
+        index
+        for index, preference in enumerate(preferences)
+        if preference.court == court and preference.start == start
+    )
+    return ("booked", rank)
+
+
+def simulate(days: list, strategy: Strategy) -> dict:
+    """Runs the booking flow for each recorded day
+
+    Args:
+        days (list): List of SimulatedDay
+        strategy (Strategy): Strategy being evaluated
+
+    Returns:
+        (dict) Count of each outcome, mean rank of booked preferences and days
+                simulated per second
+    """
+    summary = dict.fromkeys(OUTCOMES, 0)
+    ranks = []
+    started = time.perf_counter()
+    for day in days:
+        outcome, rank = simulate_day(day, strategy)
+        summary[outcome] += 1
+        if rank is not None:
+            ranks.append(rank)
+    elapsed = time.perf_counter() - started
+
+    summary["mean_rank"] = sum(ranks) / len(ranks) if ranks else None
+    summary["days_per_second"] = len(days) / elapsed if elapsed else None
+    return summary
+
+
+def load_days(path: str) -> list:
+    """Returns recorded booking days from a JSON lines file"""
+    with open(path, encoding="utf-8") as days_file:
+        return [SimulatedDay(json.loads(line)) for line in days_file if line.strip()]
+
+
+def load_strategies(path: str) -> list:
+    """Returns strategies from a JSON file"""
+    with open(path, encoding="utf-8") as strategies_file:
+        return [Strategy(**strategy) for strategy in json.load(strategies_file)]
+
+
+def main() -> None:
+    """Prints a summary for each strategy"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("days", help="JSON lines file of recorded booking days")
+    parser.add_argument("strategies", help="JSON file of strategies")
+    args = parser.parse_args()
+
+    days = load_days(args.days)
+    strategies = load_strategies(args.strategies)
+
+    # Per-day logging from the booking flow would dominate run time
+    logging.disable(logging.WARNING)
+    for strategy in strategies:
+        summary = simulate(days, strategy)
+        print(f"{strategy.name}: {json.dumps(summary)}")
+
+
+if __name__ == "__main__":
+    main()
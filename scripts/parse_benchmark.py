@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+""" Measures response parsing throughput with a process pool of 1 to N workers
+
+Fixture pages shaped like app.courtreserve.com responses are generated and
+parsed with the parsers used by CourtReserveAdapter.
+
+Usage:
+    python scripts/parse_benchmark.py --pages 400
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        "..",
+        "court_scheduler",
+        "court_scheduler_lambda",
+    ),
+)
+import parsers  # pylint: disable=wrong-import-position
+
+# Filler markup repeated in HTML fixtures to approach the size of real pages
+FILLER = "".join(
+    f'<div class="row"><div class="col-md-4"><span>Item {i}</span>'
+    f'<a href="/Online/Item/{i}">Link</a></div></div>'
+    for i in range(400)
+)
+
+
+def login_page() -> bytes:
+    """Returns a login page fixture"""
+    return (
+        f"<html><body>{FILLER}"
+        '<form id="loginForm">'
+        '<input name="__RequestVerificationToken" type="hidden" value="token123"/>'
+        "</form></body></html>"
+    ).encode()
+
+
+def home_page() -> bytes:
+    """Returns a fixture of the page shown after login"""
+    return (
+        '<html><body><ul id="respMenu"><li><a href="/">Home</a></li>'
+        '<li><a href="#">Reservations</a><ul>'
+        '<li><a href="/Online/Reservations/Bookings/1234?sId=5678">Bookings</a></li>'
+        f"</ul></li></ul>{FILLER}</body></html>"
+    ).encode()
+
+
+def bookings_page() -> bytes:
+    """Returns a Bookings page fixture"""
+    script = (
+        "function getSelectedCriteriasCourtsView() { return {"
+        " TimeZone: 'America/Los_Angeles', CostTypeId: '1234',"
+        " SelectedCourtIds: '1,2,3,4,5,6', MemberIds: '4321' }; }"
+    )
+    return (
+        '<html><body><div id="expanded-page"><div class="content"><div class="row">'
+        f'<div class="col-lg-12">{FILLER}<script>{script}</script></div>'
+        "</div></div></div></body></html>"
+    ).encode()
+
+
+def read_expanded(bookings: int = 200) -> bytes:
+    """Returns a ReadExpanded response fixture"""
+    start_ms = 1634140800000
+    data = [
+        {
+            "CourtLabel": f"Court #{i % 6 + 1}",
+            "CourtId": i % 6 + 1,
+            "Start": f"/Date({start_ms + i * 1800000})/",
+            "End": f"/Date({start_ms + i * 1800000 + 3600000})/",
+        }
+        for i in range(bookings)
+    ]
+    return json.dumps({"Total": len(data), "Data": data}).encode()
+
+
+FIXTURES = (
+    (parsers.parse_login_token, login_page()),
+    (parsers.parse_session_id, home_page()),
+    (parsers.parse_court_criteria, bookings_page()),
+    (parsers.parse_bookings, read_expanded()),
+)
+
+
+def run(executor, pages: int) -> float:
+    """Returns pages parsed per second"""
+    jobs = [FIXTURES[i % len(FIXTURES)] for i in range(pages)]
+    started = time.perf_counter()
+    if executor is None:
+        for parser, content in jobs:
+            parser(content)
+    else:
+        futures = [executor.submit(parser, content) for parser, content in jobs]
+        for future in futures:
+            future.result()
+    return pages / (time.perf_counter() - started)
+
+
+def main() -> None:
+    """Prints parsing throughput for each worker count"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    serial = run(None, args.pages)
+    print(f"{'inline':>8}: {serial:8.1f} pages/s")
+    workers = 1
+    while workers <= args.max_workers:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Warm up worker processes before timing
+            run(executor, workers)
+            throughput = run(executor, args.pages)
+        print(f"{workers:>8}: {throughput:8.1f} pages/s ({throughput / serial:.2f}x)")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()